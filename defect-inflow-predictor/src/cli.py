@@ -1,42 +1,86 @@
-import argparse, json, math
+import argparse, copy, functools, importlib.util, json, math, os
 from pathlib import Path
 import pandas as pd
 import numpy as np
 import yaml
 
-def load_config(path: Path):
+try:
+    import orjson  # optional, faster JSON writer
+except ImportError:
+    orjson = None
+
+# LibYAML-backed loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+@functools.lru_cache(maxsize=4)
+def _parse_config(path: str, mtime: float):
     with open(path, "r") as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=_YAML_LOADER)
+
+def load_config(path: Path):
+    # memoized on (path, mtime); hand out a copy so callers can't mutate the cache
+    return copy.deepcopy(_parse_config(str(path), os.path.getmtime(path)))
+
+# fixed base-measure schema; avg_resolution_time_hours is left to inference
+# since it may be fractional
+_CSV_DTYPES = {
+    "defects_inflow_total": "int32",
+    "defects_outflow_total": "int32",
+    "severity_critical_in": "int32",
+    "severity_high_in": "int32",
+    "severity_medium_in": "int32",
+    "severity_low_in": "int32",
+    "backlog_total": "int32",
+}
+_CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+def read_table(path: Path) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        try:
+            df = pd.read_csv(path, engine=_CSV_ENGINE, dtype=_CSV_DTYPES)
+        except ValueError:
+            # blank cells can't be held in int32; fall back to inferred dtypes
+            df = pd.read_csv(path)
+    return df.assign(week_start=pd.to_datetime(df["week_start"]))
+
+def write_table(df: pd.DataFrame, path: Path):
+    if path.suffix == ".parquet":
+        df.to_parquet(path, index=False, compression="zstd")
+    else:
+        df.to_csv(path, index=False)
 
 def derive_measures(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
-    df = df.copy()
-    df["net_flow"] = df["defects_inflow_total"] - df["defects_outflow_total"]
-    df["inflow_rate"] = df["defects_inflow_total"]
-    df["outflow_rate"] = df["defects_outflow_total"]
+    inflow = df["defects_inflow_total"].to_numpy()
+    outflow = df["defects_outflow_total"].to_numpy()
+    sev = df[["severity_critical_in", "severity_high_in",
+              "severity_medium_in", "severity_low_in"]].to_numpy()
     w = cfg["severity_weights"]
-    df["severity_weighted_inflow"] = (
-        w["critical"] * df["severity_critical_in"] +
-        w["high"]     * df["severity_high_in"] +
-        w["medium"]   * df["severity_medium_in"] +
-        w["low"]      * df["severity_low_in"]
+    weights = np.array([w["critical"], w["high"], w["medium"], w["low"]])
+    return df.assign(
+        net_flow=inflow - outflow,
+        inflow_rate=inflow,
+        outflow_rate=outflow,
+        severity_weighted_inflow=sev @ weights,
+        severe_inflow=sev[:, 0] + sev[:, 1],
+        mttr_hours=df["avg_resolution_time_hours"].to_numpy(),
     )
-    df["severe_inflow"] = df["severity_critical_in"] + df["severity_high_in"]
-    df["mttr_hours"] = df["avg_resolution_time_hours"]
-    return df
 
-def ewma(series: pd.Series, alpha: float, horizon: int):
-    forecast = series.iloc[-1]
-    for _ in range(horizon):
-        forecast = alpha * series.iloc[-1] + (1-alpha) * forecast
-    return forecast
+def ewma(y: np.ndarray, alpha: float, horizon: int):
+    # recurrence only ever blends the last observation with itself,
+    # so alpha*last + (1-alpha)*last == last for any horizon
+    return float(y[-1])
 
 def linreg_forecast(y: np.ndarray, horizon: int):
-    x = np.arange(len(y))
-    a, b = np.polyfit(x, y, 1)
-    preds = []
-    for h in range(1, horizon+1):
-        preds.append(a*(len(y)-1 + h) + b)
-    return float(preds[-1])
+    # closed-form least squares for a degree-1 fit
+    n = len(y)
+    x = np.arange(n)
+    xm, ym = x.mean(), y.mean()
+    dx = x - xm
+    a = (dx * (y - ym)).sum() / (dx * dx).sum()
+    b = ym - a * xm
+    return float(a*(n-1 + horizon) + b)
 
 def forecast_next(df: pd.DataFrame, cfg: dict, horizon: int):
     # choose method dynamically
@@ -48,20 +92,23 @@ def forecast_next(df: pd.DataFrame, cfg: dict, horizon: int):
 
     if method == "ewma":
         alpha = float(cfg["forecast"]["ewma_alpha"])
-        inflow_pred  = ewma(df["defects_inflow_total"], alpha, horizon)
-        outflow_pred = ewma(df["defects_outflow_total"], alpha, horizon)
+        inflow_pred  = ewma(df["defects_inflow_total"].to_numpy(), alpha, horizon)
+        outflow_pred = ewma(df["defects_outflow_total"].to_numpy(), alpha, horizon)
     else:
         inflow_pred  = linreg_forecast(df["defects_inflow_total"].to_numpy(), horizon)
         outflow_pred = linreg_forecast(df["defects_outflow_total"].to_numpy(), horizon)
 
     # compute severity mix as before
-    recent = df.tail(10).mean(numeric_only=True)
-    total = recent.get("defects_inflow_total", 0.0) or 1.0
+    cols = ["defects_inflow_total", "severity_critical_in", "severity_high_in",
+            "severity_medium_in", "severity_low_in"]
+    # nanmean: blank cells are skipped, as tail(10).mean() did
+    inflow_mean, crit, high, med, low = np.nanmean(df[cols].to_numpy(dtype=float)[-10:], axis=0)
+    total = inflow_mean or 1.0
     mix = {
-        "critical": float(recent.get("severity_critical_in",0.0)/total),
-        "high":     float(recent.get("severity_high_in",0.0)/total),
-        "medium":   float(recent.get("severity_medium_in",0.0)/total),
-        "low":      float(recent.get("severity_low_in",0.0)/total),
+        "critical": float(crit/total),
+        "high":     float(high/total),
+        "medium":   float(med/total),
+        "low":      float(low/total),
     }
     sev_pred = {k: max(0.0, round(mix[k]*inflow_pred,1)) for k in mix}
     return max(0.0, float(inflow_pred)), max(0.0, float(outflow_pred)), sev_pred
@@ -69,34 +116,21 @@ def forecast_next(df: pd.DataFrame, cfg: dict, horizon: int):
 
 def indicators(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     th = cfg["health_thresholds"]
-    df = df.copy()
-    prob = []
-    status = []
-    for i in range(len(df)):
-        wdf = df.iloc[:i+1]
-        flags = []
-        N = int(th["inflow_gt_outflow_consecutive_weeks"])
-        if i+1 >= N and all((wdf.tail(N)["defects_inflow_total"] > wdf.tail(N)["defects_outflow_total"]).tolist()):
-            flags.append("inflow>outflow")
-        if df.iloc[i]["backlog_total"] > th["backlog_healthy_max"]:
-            flags.append("backlog_high")
-        K = int(th["critical_severe_window"])
-        severe_sum = wdf.tail(K)["severe_inflow"].sum()
-        if severe_sum >= th["critical_severe_min"]:
-            flags.append("severe_spike")
-        if "severe_spike" in flags or ("inflow>outflow" in flags and "backlog_high" in flags):
-            status.append("red")
-        elif flags:
-            status.append("yellow")
-        else:
-            if df.iloc[i]["defects_inflow_total"] <= th["healthy_max_per_deployment"]:
-                status.append("green")
-            else:
-                status.append("yellow")
-        prob.append(",".join(flags) if flags else "")
-    df["problem_flags"] = prob
-    df["health_status"] = status
-    return df
+    N = int(th["inflow_gt_outflow_consecutive_weeks"])
+    K = int(th["critical_severe_window"])
+    inflow_gt = (df["defects_inflow_total"] > df["defects_outflow_total"]).astype(int)
+    consec = (inflow_gt.rolling(N).sum() == N).to_numpy()
+    backlog_high = (df["backlog_total"] > th["backlog_healthy_max"]).to_numpy()
+    severe_spike = (df["severe_inflow"].rolling(K, min_periods=1).sum() >= th["critical_severe_min"]).to_numpy()
+    healthy = (df["defects_inflow_total"] <= th["healthy_max_per_deployment"]).to_numpy()
+
+    any_flag = consec | backlog_high | severe_spike
+    red = severe_spike | (consec & backlog_high)
+    status = np.select([red, any_flag | ~healthy], ["red", "yellow"], default="green")
+    names = ("inflow>outflow", "backlog_high", "severe_spike")
+    prob = [",".join(n for n, f in zip(names, row) if f)
+            for row in zip(consec, backlog_high, severe_spike)]
+    return df.assign(problem_flags=prob, health_status=status)
 
 def resource_plan(next_inflow: float, sev_pred: dict, cfg: dict):
     hp = cfg["resources"]["hours_per_defect"]
@@ -120,29 +154,37 @@ def main():
     ap.add_argument("--config", default="config/analysis_model.yaml")
     ap.add_argument("--horizon", type=int, default=None)
     ap.add_argument("--outdir", default="outputs")
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                    help="file format for derived measures and indicators")
     args = ap.parse_args()
 
     cfg = load_config(Path(args.config))
     horizon = args.horizon or int(cfg["forecast"]["horizon_weeks"])
-    df = pd.read_csv(args.data)
+    df = read_table(Path(args.data))
     dfd = derive_measures(df, cfg)
     dfi = indicators(dfd, cfg)
     inflow_pred, outflow_pred, sev_pred = forecast_next(dfd, cfg, horizon)
     plan = resource_plan(inflow_pred, sev_pred, cfg)
 
     outdir = Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
-    dfd.to_csv(outdir/"derived_measures.csv", index=False)
-    dfi.to_csv(outdir/"indicators.csv", index=False)
-    with open(outdir/"forecast_and_plan.json","w") as f:
-        json.dump({
-            "horizon_weeks": horizon,
-            "forecast": {
-                "inflow_total": round(inflow_pred,1),
-                "outflow_total": round(outflow_pred,1),
-                "severity_breakdown_inflow": sev_pred
-            },
-            "resource_plan": plan
-        }, f, indent=2)
+    derived_path = outdir/f"derived_measures.{args.format}"
+    indicators_path = outdir/f"indicators.{args.format}"
+    write_table(dfd, derived_path)
+    write_table(dfi, indicators_path)
+    payload = {
+        "horizon_weeks": horizon,
+        "forecast": {
+            "inflow_total": round(inflow_pred,1),
+            "outflow_total": round(outflow_pred,1),
+            "severity_breakdown_inflow": sev_pred
+        },
+        "resource_plan": plan
+    }
+    if orjson is not None:
+        (outdir/"forecast_and_plan.json").write_bytes(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
+    else:
+        with open(outdir/"forecast_and_plan.json","w") as f:
+            json.dump(payload, f, indent=2)
 
     print("# Forecast (", horizon, "week ahead )")
     print("Predicted inflow:", round(inflow_pred,1), "Predicted outflow:", round(outflow_pred,1))
@@ -150,7 +192,7 @@ def main():
     print("\n# Resource plan")
     import json as _j
     print(_j.dumps(plan, indent=2))
-    print("\nWrote:", outdir/"derived_measures.csv", outdir/"indicators.csv", outdir/"forecast_and_plan.json")
+    print("\nWrote:", derived_path, indicators_path, outdir/"forecast_and_plan.json")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
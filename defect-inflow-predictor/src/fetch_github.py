@@ -1,54 +1,93 @@
 # Fetch GitHub issues to build weekly base measures.
 # Usage:
 #   python src/fetch_github.py --repo owner/name --since 2024-01-01 --until 2025-12-31 --out data/base_measures.csv
+#   (use an --out path ending in .parquet to write Parquet instead of CSV)
 # Notes:
-#   - Requires a GitHub token (env GITHUB_TOKEN or --token).
+#   - Requires a GitHub token (env GITHUB_TOKEN or --token). With a token, issues are
+#     pulled via the GraphQL API (only the fields used below). Without one, the
+#     REST issues endpoint is paged instead; that path (concurrent pages, ijson
+#     streaming) is only used for anonymous runs and is subject to the much lower
+#     unauthenticated rate limit.
 #   - Aggregates weekly opened (inflow) and closed (outflow) issues.
 #   - Severity inferred from labels: 'severity:critical|high|medium|low' or 'priority:p0..p3'.
-import argparse, os
-from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+import argparse, os, re
+from datetime import datetime, timezone
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import parse_qsl, urlsplit
+import numpy as np
 import pandas as pd
 import requests
 from pathlib import Path
 
-def week_floor(d):
-    return (d - timedelta(days=d.weekday())).date()
+try:
+    import ijson  # optional, streams REST pages instead of r.json()
+except ImportError:
+    ijson = None
+
+SEVERITIES = ("critical", "high", "medium", "low")
+MAX_IN_FLIGHT = 8  # concurrent REST page requests
+
+def open_backlog(inflow: np.ndarray, outflow: np.ndarray) -> np.ndarray:
+    # open backlog never goes below zero: subtract the running minimum of the
+    # cumulative net flow (floored at 0) instead of carrying max(0, ...) per week
+    cs = np.cumsum(np.asarray(inflow, dtype=np.int64) - outflow)
+    return (cs - np.minimum.accumulate(np.minimum(cs, 0))).astype(np.int32)
+
+def week_floor(d: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    return (d - pd.to_timedelta(d.weekday, unit="D")).normalize()
+
+# Label token -> (precedence, severity); lowest precedence wins. Only the spaced
+# forms "severity: high" / "severity- high" and p0..p3 are explicit. Unspaced
+# labels such as "severity-high", "severity:high" or "bugzilla/severity-high"
+# fall through to the bare keyword "high", so e.g. "severity-low" + "high"
+# resolves to high. No match at all (incl. "bug"/"defect") is medium.
+_SEV_TOKENS = {
+    "severity: critical": (0, "critical"), "p0": (0, "critical"),
+    "severity: high":     (1, "high"),     "p1": (1, "high"),
+    "severity: low":      (2, "low"),      "p3": (2, "low"),
+    "severity: medium":   (3, "medium"),   "p2": (3, "medium"),
+    "critical": (4, "critical"),
+    "high":     (5, "high"),
+    "low":      (6, "low"),
+}
+_SEV_RE = re.compile(r"severity[:\-] (critical|high|low|medium)|p[0-3]|critical|high|low")
 
 def severity_from(labels):
-    txt = " ".join([l.get("name","").lower().strip() for l in labels])
-
-    # Normalize common patterns to one of: critical/high/medium/low
-    # Examples handled:
-    # - "Severity-High", "severity-high", "bugzilla/severity-high"
-    # - "severity: high", "severity:low"
-    normalized = (
-        txt.replace("bugzilla/", "")
-           .replace("severity-", "severity:")
-    )
+    txt = " ".join([l.get("name","").lower().strip() for l in labels]).replace("bugzilla/", "")
+    best = None
+    for m in _SEV_RE.finditer(txt):
+        hit = _SEV_TOKENS["severity: " + m.group(1) if m.group(1) else m.group(0)]
+        if best is None or hit[0] < best[0]:
+            best = hit
+    return best[1] if best else "medium"
+
 
-    # direct matches like "severity: high"
-    if "severity: critical" in normalized or "p0" in normalized:
-        return "critical"
-    if "severity: high" in normalized or "p1" in normalized:
-        return "high"
-    if "severity: low" in normalized or "p3" in normalized:
-        return "low"
-    if "severity: medium" in normalized or "p2" in normalized:
-        return "medium"
-
-    # helpful fallbacks
-    if "critical" in normalized:
-        return "critical"
-    if "high" in normalized:
-        return "high"
-    if "low" in normalized:
-        return "low"
-    if "bug" in normalized or "defect" in normalized:
-        return "medium"
-
-    return "medium"
+ISSUES_QUERY = """
+query($owner: String!, $name: String!, $cursor: String, $since: DateTime) {
+  repository(owner: $owner, name: $name) {
+    issues(first: 100, after: $cursor, filterBy: {since: $since}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        id createdAt closedAt
+        labels(first: 100) { pageInfo { hasNextPage endCursor } nodes { name } }
+      }
+    }
+  }
+}
+"""
 
+# follow-up for the rare issue with more than 100 labels, so none are dropped
+LABELS_QUERY = """
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on Issue {
+      labels(first: 100, after: $cursor) { pageInfo { hasNextPage endCursor } nodes { name } }
+    }
+  }
+}
+"""
 
 def main():
     ap = argparse.ArgumentParser()
@@ -64,76 +103,157 @@ def main():
     session = requests.Session()
     session.headers.update(headers)
 
+    def page_items(r):
+        # the response is closed once its items are consumed (or the consumer
+        # stops early), so streamed connections go back to the pool
+        try:
+            if ijson is not None:
+                # parse items off the socket as they arrive instead of loading the page
+                r.raw.decode_content = True
+                yield from ijson.items(r.raw, "item")
+            else:
+                data = r.json()
+                if isinstance(data, dict):
+                    data = []
+                yield from data
+        finally:
+            r.close()
+
+    def get_page(url, params):
+        r = session.get(url, params=params, stream=ijson is not None)
+        try:
+            r.raise_for_status()
+        except requests.HTTPError:
+            r.close()
+            raise
+        return r, page_items(r)
+
+    def link(r, rel):
+        if "link" in r.headers:
+            for part in r.headers["link"].split(","):
+                if f'rel="{rel}"' in part:
+                    return part[part.find("<")+1:part.find(">")]
+        return None
+
     def paged(url, params):
+        r, data = get_page(url, params)
+        yield from data
+        last_url = link(r, "last")
+        if last_url:
+            # page count is known up front, so fetch the rest concurrently. At most
+            # MAX_IN_FLIGHT pages are requested or buffered at once, which keeps
+            # memory flat for large repos and stays friendly with GitHub's
+            # secondary rate limits; each worker parses its whole page.
+            parts = urlsplit(last_url)
+            base = f"{parts.scheme}://{parts.netloc}{parts.path}"
+            query = dict(parse_qsl(parts.query))
+            remaining = iter(range(2, int(query.pop("page"))+1))
+            fetch = lambda p: list(get_page(base, {**query, "page": p})[1])
+            with ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT) as pool:
+                window = deque(pool.submit(fetch, p) for p in islice(remaining, MAX_IN_FLIGHT))
+                while window:
+                    data = window.popleft().result()
+                    nxt = next(remaining, None)
+                    if nxt is not None:
+                        window.append(pool.submit(fetch, nxt))
+                    yield from data
+            return
+        next_url = link(r, "next")
+        while next_url:
+            r, data = get_page(next_url, {})
+            yield from data
+            next_url = link(r, "next")
+
+    def graphql(query, variables):
+        r = session.post("https://api.github.com/graphql", json={"query": query, "variables": variables})
+        r.raise_for_status()
+        payload = r.json()
+        if payload.get("errors"):
+            raise RuntimeError(f"GitHub GraphQL error: {payload['errors']}")
+        return payload["data"]
+
+    def all_labels(node):
+        labels = node["labels"]
+        names = list(labels["nodes"])
+        while labels["pageInfo"]["hasNextPage"]:
+            labels = graphql(LABELS_QUERY, {"id": node["id"], "cursor": labels["pageInfo"]["endCursor"]})["node"]["labels"]
+            names.extend(labels["nodes"])
+        return names
+
+    def graphql_issues(repo, since):
+        owner, name = repo.split("/", 1)
+        variables = {"owner": owner, "name": name, "cursor": None, "since": since}
         while True:
-            r = session.get(url, params=params)
-            r.raise_for_status()
-            data = r.json()
-            if isinstance(data, dict):
-                data = []
-            for item in data:
-                yield item
-            next_url = None
-            if "link" in r.headers:
-                for part in r.headers["link"].split(","):
-                    if 'rel="next"' in part:
-                        next_url = part[part.find("<")+1:part.find(">")]
-                        break
-            if not next_url:
+            issues = graphql(ISSUES_QUERY, variables)["repository"]["issues"]
+            for node in issues["nodes"]:
+                # same shape as REST items so the aggregation below is shared
+                yield {
+                    "created_at": node["createdAt"],
+                    "closed_at": node["closedAt"],
+                    "labels": all_labels(node),
+                }
+            if not issues["pageInfo"]["hasNextPage"]:
                 break
-            url, params = next_url, {}
+            variables["cursor"] = issues["pageInfo"]["endCursor"]
 
-    created = defaultdict(lambda: dict(inflow=0, outflow=0, sev={"critical":0,"high":0,"medium":0,"low":0}))
     since_dt = datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc)
     until_dt = datetime.fromisoformat(args.until).replace(tzinfo=timezone.utc)
 
-    for it in paged(f"https://api.github.com/repos/{args.repo}/issues", {"state":"all","since":args.since,"per_page":100}):
+    if args.token:
+        items = graphql_issues(args.repo, since_dt.isoformat())
+    else:
+        items = paged(f"https://api.github.com/repos/{args.repo}/issues", {"state":"all","since":args.since,"per_page":100})
+
+    created_raw, closed_raw, labels = [], [], []
+    for it in items:
         if "pull_request" in it:
             continue
-        created_at = datetime.fromisoformat(it["created_at"].replace("Z","+00:00"))
-        if not (since_dt <= created_at <= until_dt):
-            continue
-        wk = week_floor(created_at)
-        sev = severity_from(it.get("labels", []))
-        created[wk]["inflow"] += 1
-        created[wk]["sev"][sev] += 1
-        if it.get("closed_at"):
-            closed_at = datetime.fromisoformat(it["closed_at"].replace("Z","+00:00"))
-            cwk = week_floor(closed_at)
-            created[cwk]["outflow"] += 1
-
-    if not created:
+        created_raw.append(it["created_at"])
+        closed_raw.append(it.get("closed_at"))
+        labels.append(it.get("labels", []))
+
+    created_at = pd.to_datetime(created_raw, utc=True, format="ISO8601")
+    closed_at = pd.to_datetime(closed_raw, utc=True, format="ISO8601")
+    in_range = np.asarray((created_at >= since_dt) & (created_at <= until_dt))
+    created_wk = week_floor(created_at[in_range])
+    closed_wk = week_floor(closed_at[in_range]).dropna()
+    sevs = [severity_from(l) for l, keep in zip(labels, in_range) if keep]
+
+    if not len(created_wk):
         print("No issues found in range.")
         return
 
-    weeks = sorted(created.keys())
-    start_w, end_w = weeks[0], weeks[-1]
-    all_weeks = []
-    d = start_w
-    while d <= end_w:
-        all_weeks.append(d)
-        d = d + timedelta(days=7)
-
-    rows = []
-    running_open = 0
-    for w in all_weeks:
-        data = created.get(w, {"inflow":0,"outflow":0,"sev":{"critical":0,"high":0,"medium":0,"low":0}})
-        running_open = max(0, running_open + data["inflow"] - data["outflow"])
-        rows.append({
-            "week_start": str(w),
-            "defects_inflow_total": data["inflow"],
-            "defects_outflow_total": data["outflow"],
-            "severity_critical_in": data["sev"]["critical"],
-            "severity_high_in": data["sev"]["high"],
-            "severity_medium_in": data["sev"]["medium"],
-            "severity_low_in": data["sev"]["low"],
-            "avg_resolution_time_hours": 36,
-            "backlog_total": running_open
-        })
-
-    df = pd.DataFrame(rows)
-    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(args.out, index=False)
+    span = created_wk.append(closed_wk)
+    all_weeks = pd.date_range(span.min(), span.max(), freq="7D")
+    sev_counts = (
+        pd.DataFrame({"week": created_wk, "sev": sevs})
+          .value_counts()
+          .unstack(fill_value=0)
+          .reindex(index=all_weeks, columns=SEVERITIES, fill_value=0)
+    )
+    sev = {k: sev_counts[k].to_numpy(np.int32) for k in SEVERITIES}
+    inflow = sev_counts.sum(axis=1).to_numpy(np.int32)
+    outflow = closed_wk.value_counts().reindex(all_weeks, fill_value=0).to_numpy(np.int32)
+    n = len(all_weeks)
+    backlog = open_backlog(inflow, outflow)
+
+    df = pd.DataFrame({
+        "week_start": all_weeks.strftime("%Y-%m-%d"),
+        "defects_inflow_total": inflow,
+        "defects_outflow_total": outflow,
+        "severity_critical_in": sev["critical"],
+        "severity_high_in": sev["high"],
+        "severity_medium_in": sev["medium"],
+        "severity_low_in": sev["low"],
+        "avg_resolution_time_hours": np.full(n, 36, dtype=np.int16),
+        "backlog_total": backlog,
+    })
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix == ".parquet":
+        df.to_parquet(out, index=False, compression="zstd")
+    else:
+        df.to_csv(out, index=False)
     print("Wrote", args.out)
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from fetch_github import open_backlog
+
+
+def scalar_backlog(inflow, outflow):
+    running_open, out = 0, []
+    for i, o in zip(inflow, outflow):
+        running_open = max(0, running_open + int(i) - int(o))
+        out.append(running_open)
+    return out
+
+
+def test_open_backlog_matches_scalar_loop():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        n = int(rng.integers(1, 80))
+        inflow = rng.integers(0, 20, n).astype(np.int32)
+        outflow = rng.integers(0, 25, n).astype(np.int32)
+        assert open_backlog(inflow, outflow).tolist() == scalar_backlog(inflow, outflow)
+
+
+def test_open_backlog_edge_cases():
+    assert open_backlog(np.array([], dtype=np.int32), np.array([], dtype=np.int32)).tolist() == []
+    assert open_backlog(np.array([0, 5, 0]), np.array([3, 1, 10])).tolist() == [0, 4, 0]
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+import cli
+
+
+def test_severity_mix_skips_blank_cells():
+    cfg = cli.load_config(ROOT / "config" / "analysis_model.yaml")
+    df = pd.read_csv(ROOT / "data" / "base_measures.csv")
+    df.loc[len(df) - 3, "severity_high_in"] = np.nan
+    df.loc[len(df) - 5, "defects_inflow_total"] = np.nan
+    dfd = cli.derive_measures(df, cfg)
+
+    inflow, _, sev = cli.forecast_next(dfd, cfg, 1)
+
+    recent = df.tail(10).mean(numeric_only=True)
+    for k in ("critical", "high", "medium", "low"):
+        expected = max(0.0, round(recent[f"severity_{k}_in"] / recent["defects_inflow_total"] * inflow, 1))
+        assert sev[k] == expected
+    assert sev["medium"] > 0
+    assert cli.resource_plan(inflow, sev, cfg)["recommended_engineers"] > 0